@@ -0,0 +1,219 @@
+"""Embedding model loading and encoding, used in-process by the API or by embedding_service.py"""
+import logging
+import os
+import shutil
+import tempfile
+from typing import List
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EMBEDDING_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch" runs sentence-transformers; "onnx" / "onnx-int8" run an ONNX Runtime export on CPU
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")
+# "auto" runs bf16 (or fp16) on GPU and fp32 on CPU; set "bfloat16" on bf16-capable CPUs
+EMBEDDING_DTYPE = os.getenv("EMBEDDING_DTYPE", "auto")
+EMBEDDING_COMPILE = os.getenv("EMBEDDING_COMPILE", "false").lower() == "true"
+# Leave cores for the event loop and other uvicorn workers
+EMBEDDING_NUM_THREADS = int(os.getenv("EMBEDDING_NUM_THREADS", str(max(1, (os.cpu_count() or 2) // 2))))
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "minilm-onnx")
+ONNX_INT8_MODEL_DIR = os.getenv("ONNX_INT8_MODEL_DIR", "minilm-int8")
+# Minimum cosine similarity between fp32 and int8 embeddings before int8 is used
+QUANTIZATION_MIN_COSINE = float(os.getenv("QUANTIZATION_MIN_COSINE", "0.98"))
+# Published in place of the int8 model when it fails the drift check, so later starts skip quantizing
+QUANTIZATION_REJECTED_MARKER = "REJECTED"
+QUANTIZATION_CHECK_TEXTS = [
+    "Pandas. Data analysis and manipulation library. Tags: python, data-analysis, csv",
+    "Docker. Platform for building and running containers. Tags: devops, containers",
+    "TensorFlow. End-to-end open source machine learning platform. Tags: deep-learning",
+    "Flask. A lightweight web framework for Python. Tags: python, web, api",
+    "tools for analyzing CSV files",
+    "deep learning frameworks",
+]
+
+def resolve_embedding_dtype(device: str, dtype: str) -> torch.dtype:
+    """Pick the dtype the transformer weights are loaded in"""
+    if dtype != "auto":
+        return getattr(torch, dtype)
+    if device.startswith("cuda"):
+        return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+    return torch.float32
+
+def upcast_token_embeddings(module, inputs, features):
+    """Forward hook: hand Pooling fp32 token embeddings so mean-pool and Normalize run in fp32"""
+    features["token_embeddings"] = features["token_embeddings"].float()
+    return features
+
+def staging_dir_for(model_dir: str) -> str:
+    """Private directory next to model_dir to build a model in before publishing it"""
+    parent = os.path.dirname(os.path.abspath(model_dir))
+    return tempfile.mkdtemp(prefix=f".{os.path.basename(model_dir)}-", dir=parent)
+
+def publish_model_dir(staging_dir: str, model_dir: str):
+    """Atomically move a fully written model into place"""
+    try:
+        os.rename(staging_dir, model_dir)
+    except OSError:
+        # Another process published the same model first; keep theirs
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if not os.path.isdir(model_dir):
+            raise
+
+def export_onnx_model(model_dir: str, model_id: str = EMBEDDING_MODEL_ID):
+    """Export the embedding model to ONNX along with its tokenizer"""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from transformers import AutoTokenizer
+
+    ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(model_dir)
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(model_dir)
+
+def quantize_onnx_model(source_dir: str, target_dir: str):
+    """Write a dynamically int8-quantized copy of an exported ONNX model"""
+    from optimum.onnxruntime import ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+    ORTQuantizer.from_pretrained(source_dir).quantize(save_dir=target_dir, quantization_config=qconfig)
+    AutoTokenizer.from_pretrained(source_dir).save_pretrained(target_dir)
+
+class OnnxEmbeddingModel:
+    """ONNX Runtime drop-in for the parts of SentenceTransformer.encode we use"""
+
+    def __init__(self, model_dir: str, file_name: str = "model.onnx"):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = EMBEDDING_NUM_THREADS
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir,
+            file_name=file_name,
+            provider="CPUExecutionProvider",
+            session_options=session_options
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_seq_length = 256
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False, convert_to_tensor: bool = False):
+        single = isinstance(sentences, str)
+        if single:
+            sentences = [sentences]
+
+        # Same length-sorted batching sentence-transformers does internally
+        order = sorted(range(len(sentences)), key=lambda i: len(sentences[i]))
+        pooled = []
+        for start in range(0, len(order), batch_size):
+            batch = [sentences[i] for i in order[start:start + batch_size]]
+            features = self.tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="pt"
+            )
+            token_embeddings = self.model(**features).last_hidden_state
+            # Mean pooling over real tokens, as in the model's sentence-transformers config
+            mask = features["attention_mask"].unsqueeze(-1).to(token_embeddings.dtype)
+            pooled.append((token_embeddings * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9))
+
+        sorted_embeddings = torch.cat(pooled)
+        embeddings = torch.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        embeddings = torch.nn.functional.normalize(embeddings, p=2, dim=-1)
+        if single:
+            embeddings = embeddings[0]
+        return embeddings if convert_to_tensor else embeddings.numpy()
+
+def load_onnx_embedding_model(quantized: bool) -> OnnxEmbeddingModel:
+    """Load the ONNX model, exporting and quantizing it on first use"""
+    # Export once and reuse the saved graphs on later startups. Models are built in a
+    # staging directory and renamed into place, so other processes never see a partial one
+    if not os.path.isdir(ONNX_MODEL_DIR):
+        staging_dir = staging_dir_for(ONNX_MODEL_DIR)
+        export_onnx_model(staging_dir)
+        publish_model_dir(staging_dir, ONNX_MODEL_DIR)
+    if not quantized:
+        return OnnxEmbeddingModel(ONNX_MODEL_DIR)
+    if os.path.isdir(ONNX_INT8_MODEL_DIR):
+        if os.path.exists(os.path.join(ONNX_INT8_MODEL_DIR, QUANTIZATION_REJECTED_MARKER)):
+            logger.info(
+                "int8 embedding model was rejected earlier; using fp32 ONNX model (delete %s to retry)",
+                ONNX_INT8_MODEL_DIR
+            )
+            return OnnxEmbeddingModel(ONNX_MODEL_DIR)
+        return OnnxEmbeddingModel(ONNX_INT8_MODEL_DIR, file_name="model_quantized.onnx")
+
+    staging_dir = staging_dir_for(ONNX_INT8_MODEL_DIR)
+    quantize_onnx_model(ONNX_MODEL_DIR, staging_dir)
+    reference = OnnxEmbeddingModel(ONNX_MODEL_DIR)
+    candidate = OnnxEmbeddingModel(staging_dir, file_name="model_quantized.onnx")
+
+    # Reject the int8 model if it drifts too far from fp32 on known texts
+    similarities = (
+        reference.encode(QUANTIZATION_CHECK_TEXTS) * candidate.encode(QUANTIZATION_CHECK_TEXTS)
+    ).sum(axis=1)
+    if similarities.min() < QUANTIZATION_MIN_COSINE:
+        logger.warning(
+            "int8 embedding model drifted (min cosine %.4f < %.4f); using fp32 ONNX model",
+            similarities.min(),
+            QUANTIZATION_MIN_COSINE
+        )
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+        # Remember the verdict instead of re-quantizing on every start
+        marker_dir = staging_dir_for(ONNX_INT8_MODEL_DIR)
+        with open(os.path.join(marker_dir, QUANTIZATION_REJECTED_MARKER), "w") as f:
+            f.write(f"min cosine {similarities.min():.4f} < {QUANTIZATION_MIN_COSINE}\n")
+        publish_model_dir(marker_dir, ONNX_INT8_MODEL_DIR)
+        return reference
+
+    publish_model_dir(staging_dir, ONNX_INT8_MODEL_DIR)
+    return OnnxEmbeddingModel(ONNX_INT8_MODEL_DIR, file_name="model_quantized.onnx")
+
+if EMBEDDING_BACKEND in ("onnx", "onnx-int8"):
+    embedding_model = load_onnx_embedding_model(quantized=EMBEDDING_BACKEND == "onnx-int8")
+else:
+    torch.set_num_threads(EMBEDDING_NUM_THREADS)
+    embedding_model = SentenceTransformer(EMBEDDING_MODEL_ID, device=EMBEDDING_DEVICE)
+    embedding_model[0].auto_model.to(dtype=resolve_embedding_dtype(EMBEDDING_DEVICE, EMBEDDING_DTYPE))
+    # Only the transformer runs in bf16/fp16; summing tokens in half precision loses accuracy
+    embedding_model[0].register_forward_hook(upcast_token_embeddings)
+    embedding_model.eval()
+    if EMBEDDING_COMPILE:
+        # dynamic=True avoids recompiling for every padded sequence length
+        embedding_model[0].auto_model = torch.compile(
+            embedding_model[0].auto_model,
+            mode="reduce-overhead",
+            dynamic=True
+        )
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+# Cap token length so a few very long descriptions don't blow up attention cost
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "256"))
+embedding_model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
+
+def encode_texts(texts, batch_size: int = 32) -> np.ndarray:
+    """Run the embedding model and return fp32, L2-normalized vectors"""
+    embeddings = embedding_model.encode(
+        texts,
+        batch_size=batch_size,
+        show_progress_bar=False,
+        convert_to_tensor=True
+    )
+    # Pooling and normalization already ran in fp32 in both backends
+    return embeddings.float().cpu().numpy()
+
+def warm_up_embedding_model():
+    """Run a throwaway batch so lazy init and compilation happen before traffic"""
+    encode_texts(["warmup"] * 8, batch_size=8)
+
+def create_embeddings(texts: List[str]) -> np.ndarray:
+    """Generate embeddings for many texts in a single batched forward pass"""
+    # Both backends already sort by length internally, so mini-batches pad to similar lengths
+    return encode_texts(texts, batch_size=EMBEDDING_BATCH_SIZE)
@@ -0,0 +1,172 @@
+"""Standalone embedding server, so API workers share one model instance
+
+API workers connect with EmbeddingServiceClient (DEALER socket) and send
+(request_id, JSON list of texts). The server (ROUTER socket) coalesces
+requests from all workers into one encode call and replies with
+(request_id, status, float32 bytes). Health checks send (request_id, "ping", "")
+and are answered with status "pong" straight from the receive loop, so they
+never wait behind queued encode work.
+"""
+import asyncio
+import json
+import logging
+import os
+import uuid
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EMBEDDING_SERVICE_BIND = os.getenv("EMBEDDING_SERVICE_BIND", "tcp://*:5555")
+# Requests from all workers arriving within this window share one forward pass
+EMBEDDING_SERVICE_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_SERVICE_BATCH_WAIT_MS", "5"))
+EMBEDDING_SERVICE_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_SERVICE_MAX_BATCH_SIZE", "64"))
+
+class EmbeddingServiceClient:
+    """Async client multiplexing embedding requests over one DEALER socket"""
+
+    def __init__(self, url: str, dim: int, timeout: float):
+        self.url = url
+        self.dim = dim
+        self.timeout = timeout
+        self.socket = None
+        self.receiver: Optional[asyncio.Task] = None
+        self.pending: Dict[bytes, asyncio.Future] = {}
+
+    def connect(self):
+        import zmq
+        import zmq.asyncio
+
+        self.socket = zmq.asyncio.Context.instance().socket(zmq.DEALER)
+        self.socket.connect(self.url)
+        self.receiver = asyncio.create_task(self.receive())
+
+    def close(self):
+        if self.receiver is not None:
+            self.receiver.cancel()
+        if self.socket is not None:
+            self.socket.close(linger=0)
+
+    async def request(self, frames: List[bytes], timeout: float):
+        request_id = uuid.uuid4().bytes
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            await self.socket.send_multipart([request_id, *frames])
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        return await self.request([json.dumps(texts).encode()], self.timeout)
+
+    async def ping(self, timeout: float):
+        """Check the service is answering, without queueing behind encode work"""
+        await self.request([b"ping", b""], timeout)
+
+    async def receive(self):
+        while True:
+            frames = await self.socket.recv_multipart()
+            # A bad reply fails only its own request, never this loop
+            try:
+                request_id, status, body = frames
+            except ValueError:
+                logger.warning("Dropping embedding reply with %d frames", len(frames))
+                continue
+            future = self.pending.get(request_id)
+            # The caller may have timed out already
+            if future is None or future.done():
+                continue
+            try:
+                if status == b"pong":
+                    future.set_result(None)
+                    continue
+                if status != b"ok":
+                    raise RuntimeError(f"Embedding service error: {body.decode(errors='replace')}")
+                future.set_result(np.frombuffer(body, dtype=np.float32).reshape(-1, self.dim))
+            except Exception as e:
+                logger.warning("Embedding request failed: %s", e)
+                future.set_exception(e)
+
+async def serve():
+    import zmq
+    import zmq.asyncio
+    import embedder
+
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, embedder.warm_up_embedding_model)
+
+    socket = zmq.asyncio.Context.instance().socket(zmq.ROUTER)
+    socket.bind(EMBEDDING_SERVICE_BIND)
+    logger.info("Embedding service listening on %s", EMBEDDING_SERVICE_BIND)
+
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def receive():
+        while True:
+            frames = await socket.recv_multipart()
+            if len(frames) == 4 and frames[2] == b"ping":
+                # Answer health checks right away instead of behind the batch queue
+                identity, request_id = frames[:2]
+                await socket.send_multipart([identity, request_id, b"pong", b""])
+                continue
+            # A malformed request is rejected on its own; it must not stop the server
+            try:
+                identity, request_id, body = frames
+            except ValueError:
+                logger.warning("Dropping request with %d frames", len(frames))
+                continue
+            try:
+                texts = json.loads(body)
+                if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+                    raise ValueError("expected a JSON list of strings")
+            except ValueError as e:
+                logger.warning("Rejecting malformed request: %s", e)
+                await socket.send_multipart([identity, request_id, b"error", str(e).encode()])
+                continue
+            await queue.put((identity, request_id, texts))
+
+    async def process():
+        while True:
+            batch = [await queue.get()]
+            size = len(batch[0][2])
+
+            # Collect more requests until the batch is full or the window elapses
+            deadline = loop.time() + EMBEDDING_SERVICE_BATCH_WAIT_MS / 1000
+            while size < EMBEDDING_SERVICE_MAX_BATCH_SIZE:
+                try:
+                    request = await asyncio.wait_for(queue.get(), deadline - loop.time())
+                except asyncio.TimeoutError:
+                    break
+                batch.append(request)
+                size += len(request[2])
+
+            texts = [text for _, _, request_texts in batch for text in request_texts]
+            try:
+                vectors = await loop.run_in_executor(None, embedder.create_embeddings, texts)
+            except Exception as e:
+                logger.exception("Failed to embed %d texts", len(texts))
+                for identity, request_id, _ in batch:
+                    try:
+                        await socket.send_multipart([identity, request_id, b"error", str(e).encode()])
+                    except Exception:
+                        logger.exception("Failed to send error for request %s", request_id.hex())
+                continue
+
+            # Split the batch back into one reply per request
+            offset = 0
+            for identity, request_id, request_texts in batch:
+                chunk = vectors[offset:offset + len(request_texts)].astype(np.float32, copy=False)
+                offset += len(request_texts)
+                try:
+                    await socket.send_multipart([identity, request_id, b"ok", chunk.tobytes()])
+                except Exception:
+                    logger.exception("Failed to send reply for request %s", request_id.hex())
+
+    await asyncio.gather(receive(), process())
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve())
@@ -4,6 +4,12 @@ import time
 
 BASE_URL = "http://localhost:8000"
 
+# Reuse keep-alive connections across all calls
+SESSION = requests.Session()
+adapter = requests.adapters.HTTPAdapter(pool_connections=20, pool_maxsize=20)
+SESSION.mount("http://", adapter)
+SESSION.mount("https://", adapter)
+
 def print_header(title):
     print("\n" + "="*50)
     print(f"====== {title.upper()} ======")
@@ -15,7 +21,7 @@ def pretty_print(data):
 def check_health():
     print_header("Health Check")
     try:
-        response = requests.get(f"{BASE_URL}/health")
+        response = SESSION.get(f"{BASE_URL}/health")
         response.raise_for_status()
         print("API is healthy!")
         pretty_print(response.json())
@@ -37,12 +43,26 @@ def insert_tools():
     inserted_tools = []
     for tool in tools:
         try:
-            response = requests.post(f"{BASE_URL}/tools/", json=tool)
+            response = SESSION.post(f"{BASE_URL}/tools/", json=tool)
             response.raise_for_status()
             print(f"Inserted: {tool['name']}")
             inserted_tools.append(response.json())
         except requests.exceptions.RequestException as e:
             print(f"Error inserting {tool['name']}: {e.response.json()}")
+    
+    print("\n--- Inserting more tools with one bulk request ---")
+    bulk_tools = [
+        {"name": "Pandas", "description": "Data structures and tools for reading, cleaning and analyzing tabular data like CSV and Excel files.", "tags": ["python", "data-analysis", "csv", "dataframe"]},
+        {"name": "PyTorch", "description": "An open source deep learning framework for building and training neural networks.", "tags": ["python", "deep-learning", "machine-learning", "gpu"]},
+        {"name": "Docker", "description": "A platform for building, shipping and running applications in containers.", "tags": ["devops", "containers", "deployment"]},
+    ]
+    try:
+        response = SESSION.post(f"{BASE_URL}/tools/bulk", json=bulk_tools)
+        response.raise_for_status()
+        print(f"Bulk inserted: {', '.join(tool['name'] for tool in bulk_tools)}")
+        inserted_tools.extend(response.json())
+    except requests.exceptions.RequestException as e:
+        print(f"Error bulk inserting tools: {e.response.json()}")
             
     print("\n--- Wait 10s for embedding model to download on first run ---")
     time.sleep(10)
@@ -59,7 +79,7 @@ def semantic_search():
     for query in queries:
         print(f"\nSearching for: '{query}'")
         try:
-            response = requests.post(f"{BASE_URL}/tools/search", json={"query": query, "limit": 2})
+            response = SESSION.post(f"{BASE_URL}/tools/search", json={"query": query, "limit": 2})
             response.raise_for_status()
             pretty_print(response.json())
         except requests.exceptions.RequestException as e:
@@ -74,23 +94,23 @@ def crud_test(tool_uuid):
 
     # Read
     print(f"\n--- Reading tool {tool_uuid} ---")
-    response = requests.get(f"{BASE_URL}/tools/{tool_uuid}")
+    response = SESSION.get(f"{BASE_URL}/tools/{tool_uuid}")
     pretty_print(response.json())
 
     # Update
     print(f"\n--- Updating tool {tool_uuid} ---")
     update_data = {"tags": ["python", "data-analysis", "csv", "excel", "UPDATED_TAG"]}
-    response = requests.put(f"{BASE_URL}/tools/{tool_uuid}", json=update_data)
+    response = SESSION.put(f"{BASE_URL}/tools/{tool_uuid}", json=update_data)
     pretty_print(response.json())
 
     # Delete
     print(f"\n--- Deleting tool {tool_uuid} ---")
-    response = requests.delete(f"{BASE_URL}/tools/{tool_uuid}")
+    response = SESSION.delete(f"{BASE_URL}/tools/{tool_uuid}")
     pretty_print(response.json())
 
     # Verify Delete
     print(f"\n--- Verifying deletion ---")
-    response = requests.get(f"{BASE_URL}/tools/{tool_uuid}")
+    response = SESSION.get(f"{BASE_URL}/tools/{tool_uuid}")
     if response.status_code == 404:
         print("Tool successfully deleted (Got 404 Not Found).")
     else:
@@ -99,7 +119,7 @@ def crud_test(tool_uuid):
 def show_history():
     print_header("4. Showing Search History")
     try:
-        response = requests.get(f"{BASE_URL}/search/history?limit=5")
+        response = SESSION.get(f"{BASE_URL}/search/history?limit=5")
         response.raise_for_status()
         print("Recent searches:")
         pretty_print(response.json())